@@ -1,26 +1,557 @@
 import re
 import sys
 import os
+import codecs
+import json
+import hashlib
+import shutil
+import mmap
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from dataclasses import dataclass, asdict
+from functools import lru_cache
 import tantivy
 from mcp.server import Server
 from mcp.types import Tool, TextContent
 import mcp.server.stdio
 import asyncio
+import time
+from collections import OrderedDict
 
 
 SEARCH_PATH = None
 USE_FULL_PATH = False
-SEARCH_INDEX = None
+SEARCH_INDEXES = OrderedDict()
+INDEX_GENERATION = 0
+
+INDEX_VERSION = 5
+INDEX_CACHE_DIR = Path(os.getenv('XDG_CACHE_HOME') or Path.home() / '.cache') / 'local-file-search-mcp'
+
+FUZZY_DISTANCE = 2
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+MMAP_THRESHOLD = 1 << 20
+MAX_FILE_BYTES = 10 << 20
+WRITER_HEAP_SIZE = 256 << 20
+MAX_CACHED_INDEXES = 16
+RESULT_CACHE_SIZE = 128
+RESULT_CACHE_TTL = 60
+HIT_SEPARATOR = "-" * 20
+SKIP_DIRS = {
+    '.git', '.hg', '.svn', 'node_modules', '__pycache__',
+    '.venv', 'venv', '.mypy_cache', '.pytest_cache', '.ruff_cache', '.tox'
+}
+BINARY_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.ico', '.webp',
+    '.pdf', '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.jar',
+    '.exe', '.dll', '.so', '.dylib', '.o', '.a', '.lib', '.pyc', '.class',
+    '.mp3', '.mp4', '.wav', '.avi', '.mov', '.mkv',
+    '.woff', '.woff2', '.ttf', '.otf', '.sqlite', '.db'
+}
+
+_PLAIN_QUERY_RE = re.compile(r'[\w\s]*')
+_TERM_RE = re.compile(r'[^\W_]+')
+_QUERY_OPERATORS = frozenset(('AND', 'OR', 'NOT'))
+
+_INDEX_LOCK = asyncio.Lock()
+_WORKERS = min(32, (os.cpu_count() or 1) * 2)
+_POOL = ThreadPoolExecutor(max_workers=_WORKERS)
+_RESULT_CACHE = OrderedDict()
 
 server = Server("search-server")
 
+def _fuzzy_distance(length):
+    return 0 if length < 3 else 1 if length < 6 else FUZZY_DISTANCE
+
+def _fuzzy_query(index, query, exact):
+    # Plain word queries get a per-term edit budget so Tantivy's automaton can
+    # reject long-distance candidates early; short words stay prefix-only
+    if _PLAIN_QUERY_RE.fullmatch(query) and _QUERY_OPERATORS.isdisjoint(query.split()):
+        schema = index.schema
+        clauses = [(tantivy.Occur.Should, exact)]
+        # Terms must already be lowercase like the indexed tokens; fold the query once
+        for term in _TERM_RE.findall(query.lower()):
+            clauses.append((tantivy.Occur.Should, tantivy.Query.fuzzy_term_query(
+                schema, "content", term, distance=_fuzzy_distance(len(term)), prefix=True
+            )))
+        return tantivy.Query.boolean_query(clauses)
+    
+    # Queries with operators or phrases keep their structure; Tantivy applies
+    # one fuzzy setting to every term of the field, so the shortest term sets it
+    terms = [term for term in _TERM_RE.findall(query) if term not in _QUERY_OPERATORS]
+    distance = _fuzzy_distance(min(map(len, terms))) if terms else 0
+    fuzzy = index.parse_query(query, ["content"], fuzzy_fields={"content": (True, distance, True)})
+    return tantivy.Query.boolean_query([
+        (tantivy.Occur.Should, exact),
+        (tantivy.Occur.Should, fuzzy)
+    ])
+
+# Parsed queries are immutable, so repeated queries reuse them; the cache is
+# cleared whenever an index is built so it never keeps an evicted index alive
+@lru_cache(maxsize=256)
+def _parse_queries(search_index, query, bypass_fuzzy):
+    tantivy_query = search_index.parse_query(query, ["content"])
+    fuzzy_query = None if bypass_fuzzy else _fuzzy_query(search_index, query, tantivy_query)
+    return tantivy_query, fuzzy_query
+
+def _last_space(raw, start, end):
+    return max(raw.rfind(b' ', start, end), raw.rfind(b'\n', start, end))
+
+def _first_space(raw, start, end):
+    spaces = [i for i in (raw.find(b' ', start, end), raw.find(b'\n', start, end)) if i >= 0]
+    return min(spaces) if spaces else -1
+
+def _chunk_bytes(raw):
+    # Chunk on byte offsets and decode only each slice, never the whole file
+    chunks = []
+    seen = set()
+    length = len(raw)
+    i = 0
+    while i < length:
+        end = i + CHUNK_SIZE
+        if end < length:
+            # Ending on whitespace keeps words whole, so every token is indexed
+            # in one chunk and the overlap only has to carry phrases across
+            space = _last_space(raw, i + CHUNK_SIZE // 2, end)
+            if space > 0:
+                end = space + 1
+        chunk = raw[i:end].decode('utf-8', errors='ignore')
+        if end >= length:
+            next_i = length
+        else:
+            # Start the next chunk on a word boundary inside the overlap
+            next_i = end - CHUNK_OVERLAP
+            space = _first_space(raw, next_i, end - 1)
+            if space >= 0:
+                next_i = space + 1
+        if chunk and not chunk.isspace():  # Skip blank chunks without copying them
+            # Repeated boilerplate would only produce identical hits; index its first occurrence
+            if chunk not in seen:
+                seen.add(chunk)
+                chunks.append((i, chunk))
+        i = next_i
+    return chunks
+
+def _is_text(head):
+    if b'\x00' in head:
+        return False
+    try:
+        # Incremental decoding tolerates a character cut off at the end of the sample
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+def _file_chunks(file_path):
+    # Returns the content hash alongside the chunks so unchanged files can be
+    # recognized without indexing them again
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(8192)
+            # Skip binaries before reading the rest: text practically never
+            # contains NUL, and what is indexed must decode as UTF-8
+            if not _is_text(head):
+                return "", []
+            
+            # Large files are paged in by the OS as the chunks are sliced
+            # instead of being copied into one transient buffer
+            if os.fstat(f.fileno()).st_size > MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as raw:
+                    return hashlib.sha256(raw).hexdigest(), _chunk_bytes(raw)
+            
+            raw = head + f.read()
+            return hashlib.sha256(raw).hexdigest(), _chunk_bytes(raw)
+    except:
+        return "", []
+
+def _cached_result(key):
+    entry = _RESULT_CACHE.get(key)
+    if entry is None:
+        return None
+    if time.monotonic() - entry[0] > RESULT_CACHE_TTL:
+        # Snippets are read from disk, so old entries may no longer match the files
+        del _RESULT_CACHE[key]
+        return None
+    _RESULT_CACHE.move_to_end(key)
+    return entry[1]
+
+def _cache_result(key, text):
+    _RESULT_CACHE[key] = (time.monotonic(), text)
+    _RESULT_CACHE.move_to_end(key)
+    if len(_RESULT_CACHE) > RESULT_CACHE_SIZE:
+        _RESULT_CACHE.popitem(last=False)
+
+def _is_floating_glob(file_pattern):
+    # Like .gitignore, a wildcard pattern without '/' matches file names at any depth
+    return '/' not in file_pattern and any(c in file_pattern for c in '*?[')
+
+@lru_cache(maxsize=64)
+def _compile_glob(file_pattern):
+    # '*' and '?' stay inside one path segment; '**' crosses directories and
+    # '**/' also matches no directory at all
+    parts = ['(?:.*/)?'] if _is_floating_glob(file_pattern) else []
+    i, n = 0, len(file_pattern)
+    while i < n:
+        c = file_pattern[i]
+        i += 1
+        if c == '*':
+            if file_pattern.startswith('*', i):
+                i += 1
+                if file_pattern.startswith('/', i):
+                    i += 1
+                    parts.append('(?:.*/)?')
+                else:
+                    parts.append('.*')
+            else:
+                parts.append('[^/]*')
+        elif c == '?':
+            parts.append('[^/]')
+        elif c == '[':
+            j = i
+            if j < n and file_pattern[j] == '!':
+                j += 1
+            if j < n and file_pattern[j] == ']':
+                j += 1
+            j = file_pattern.find(']', j)
+            if j == -1:
+                parts.append('\\[')
+                continue
+            stuff = re.sub(r'([\\&~|\[])', r'\\\1', file_pattern[i:j])
+            i = j + 1
+            if stuff.startswith('!'):
+                stuff = '^' + stuff[1:]
+            elif stuff.startswith('^'):
+                stuff = '\\' + stuff
+            parts.append(f'[{stuff}]')
+        else:
+            parts.append(re.escape(c))
+    return re.compile('(?s:' + ''.join(parts) + ')\\Z').match
+
+def _scan_dir(directory, keep, keep_dir):
+    subdirs = []
+    files = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in SKIP_DIRS and keep_dir(entry):
+                        subdirs.append(entry.path)
+                elif entry.is_file() and keep(entry):
+                    entry.stat()  # Cached on the entry, so the syscall runs on the pool too
+                    files.append(entry)
+    except OSError:
+        pass
+    return subdirs, files
+
+def _walk(root, keep, keep_dir):
+    # Directories are listed concurrently on the shared pool; DirEntry caches
+    # the file type from readdir, so no extra stat per entry
+    pending = {_POOL.submit(_scan_dir, root, keep, keep_dir)}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            subdirs, files = future.result()
+            pending.update(_POOL.submit(_scan_dir, subdir, keep, keep_dir) for subdir in subdirs)
+            yield from files
+
+@dataclass
+class FileMetadata:
+    path: str
+    sha256: str
+    mtime_ns: int
+    size: int
+
+@dataclass(slots=True)
+class Hit:
+    file: str
+    score: float
+    chunk: str
+    char_offset: int
+
+def _index_dir(search_path, file_pattern, full_path_output):
+    key = f"{search_path.resolve()}\n{file_pattern}\n{full_path_output}"
+    return INDEX_CACHE_DIR / f"v{INDEX_VERSION}" / hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def _last_used(entry):
+    try:
+        return entry.stat().st_mtime
+    except OSError:
+        return 0
+
+def _prune_index_cache(in_use):
+    # Indexes written by other versions are never read again, and every glob
+    # pattern gets its own index, so only the most recently used ones are kept
+    version_dir = INDEX_CACHE_DIR / f"v{INDEX_VERSION}"
+    try:
+        with os.scandir(INDEX_CACHE_DIR) as entries:
+            stale = [entry.path for entry in entries if entry.name != version_dir.name]
+        with os.scandir(version_dir) as entries:
+            cached = sorted(entries, key=_last_used, reverse=True)
+    except OSError:
+        return
+    stale.extend(entry.path for entry in cached[MAX_CACHED_INDEXES:] if entry.path not in in_use)
+    for path in stale:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def _open_writer(index):
+    # A large heap keeps bulk builds in few big segments, so fewer merges;
+    # Tantivy already sizes its indexing threads to the available cores
+    return index.writer(heap_size=WRITER_HEAP_SIZE)
+
+def _load_manifest(manifest_path):
+    try:
+        entries = json.loads(manifest_path.read_text(encoding='utf-8'))
+        return {entry["path"]: FileMetadata(**entry) for entry in entries}
+    except:
+        return None
+
+def _build_index(search_path, file_pattern, full_path_output):
+    schema_builder = tantivy.SchemaBuilder()
+    # Paths are indexed as single raw terms so a file's chunks can be deleted by path
+    schema_builder.add_text_field("path", stored=True, tokenizer_name="raw")
+    # Content is only indexed; snippets are read back from the file at the stored offset
+    schema_builder.add_text_field("content", stored=False, tokenizer_name="default")
+    schema_builder.add_integer_field("char_offset", stored=True, indexed=False)
+    schema = schema_builder.build()
+    
+    pattern_match = _compile_glob(file_pattern) if file_pattern != "*" else None
+    # Every walked path starts with the search path, so relative paths are plain slices
+    prefix_len = len(os.path.join(str(search_path), ''))
+    
+    def relative(entry_path):
+        return entry_path[prefix_len:].replace(os.sep, '/')
+    
+    def keep(entry):
+        if os.path.splitext(entry.name)[1].lower() in BINARY_EXTENSIONS:
+            return False
+        # Filter by file pattern during indexing
+        if pattern_match is not None:
+            return pattern_match(relative(entry.path)) is not None
+        return True
+    
+    # Patterns with a '/' are anchored at the search path, so only directories
+    # along their literal leading text can hold matches; everything else is pruned
+    if _is_floating_glob(file_pattern):
+        literal_prefix = ""
+    else:
+        literal_prefix = re.split(r'[*?[]', file_pattern, maxsplit=1)[0]
+    
+    def keep_dir(entry):
+        if not literal_prefix:
+            return True
+        relative_dir = relative(entry.path) + '/'
+        return relative_dir.startswith(literal_prefix) or literal_prefix.startswith(relative_dir)
+    
+    # Start the walk at the deepest directory the literal text names, so
+    # unrelated trees are never listed. Components the walk would never
+    # descend into, including symlinked directories, keep the root walk
+    # and its pruning.
+    walk_root = str(search_path)
+    base_parts = literal_prefix.split('/')[:-1]
+    if base_parts and not any(part in ('', '.', '..') or part in SKIP_DIRS for part in base_parts):
+        base_dir = walk_root
+        for part in base_parts:
+            base_dir = os.path.join(base_dir, part)
+            if os.path.islink(base_dir):
+                break
+        else:
+            walk_root = base_dir
+    
+    current = {}
+    for entry in _walk(walk_root, keep, keep_dir):
+        stat = entry.stat()
+        if stat.st_size > MAX_FILE_BYTES:
+            continue
+        
+        if full_path_output:
+            display_path = entry.path.replace(os.sep, '/')
+        else:
+            display_path = '/' + relative(entry.path)
+        current[display_path] = (entry.path, stat)
+    
+    # The index persists across restarts and only files whose size or mtime
+    # changed are read again; those whose content hash still matches are kept
+    index_dir = _index_dir(search_path, file_pattern, full_path_output)
+    manifest_path = index_dir / "manifest.json"
+    previous = _load_manifest(manifest_path)
+    
+    try:
+        index_dir.mkdir(parents=True, exist_ok=True)
+        index = tantivy.Index(schema, path=str(index_dir), reuse=True)
+        writer = None
+        if previous is None:
+            # No usable manifest: whatever the index holds cannot be trusted
+            writer = _open_writer(index)
+            writer.delete_all_documents()
+            previous = {}
+        # The directory's mtime marks when the index was last used
+        os.utime(index_dir)
+        in_use = {str(_index_dir(search_path, pattern, full_path_output)) for pattern in list(SEARCH_INDEXES)}
+        in_use.add(str(index_dir))
+        _prune_index_cache(in_use)
+    except (OSError, ValueError):
+        # Another server instance is writing this index; keep a private one in memory
+        index = tantivy.Index(schema, path=None)
+        writer = _open_writer(index)
+        manifest_path = None
+        previous = {}
+    
+    manifest = {}
+    changed = []
+    for display_path, (file_path, stat) in current.items():
+        metadata = previous.get(display_path)
+        if metadata is not None and metadata.size == stat.st_size and metadata.mtime_ns == stat.st_mtime_ns:
+            manifest[display_path] = metadata
+        else:
+            changed.append(display_path)
+    removed = [display_path for display_path in previous if display_path not in current]
+    
+    if not changed and not removed and writer is None:
+        return index
+    
+    if writer is None:
+        try:
+            writer = _open_writer(index)
+        except ValueError:
+            # Another instance holds the writer; serve the index as it is
+            return index
+    
+    for display_path in removed:
+        writer.delete_documents_by_term("path", display_path)
+    
+    def add_chunks(display_path, sha256, chunks):
+        file_path, stat = current[display_path]
+        metadata = previous.get(display_path)
+        manifest[display_path] = FileMetadata(display_path, sha256, stat.st_mtime_ns, stat.st_size)
+        # Touched but identical files keep their documents
+        if metadata is not None and metadata.size == stat.st_size and metadata.sha256 == sha256:
+            return
+        # Delete even without metadata: a crash before the manifest was written
+        # can leave documents for files the manifest never recorded
+        writer.delete_documents_by_term("path", display_path)
+        
+        for i, chunk in chunks:
+            writer.add_document(tantivy.Document(
+                path=[display_path],
+                content=[chunk],
+                char_offset=[i]
+            ))
+    
+    # Read and chunk files on the shared pool and hand each one to the writer
+    # as soon as it is ready, so disk reads overlap with indexing. The window
+    # keeps only a bounded number of files in memory ahead of the writer.
+    pending = {}
+    for display_path in changed:
+        pending[_POOL.submit(_file_chunks, current[display_path][0])] = display_path
+        if len(pending) >= 2 * _WORKERS:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                add_chunks(pending.pop(future), *future.result())
+    for future in as_completed(pending):
+        add_chunks(pending[future], *future.result())
+    
+    if manifest_path is not None:
+        # A manifest older than the commit would hide its changes on the next
+        # start; without one the index is rebuilt instead
+        try:
+            manifest_path.unlink(missing_ok=True)
+        except OSError:
+            pass
+    writer.commit()
+    # Let segment merges finish now instead of competing with later searches
+    writer.wait_merging_threads()
+    index.reload()
+    
+    if manifest_path is not None:
+        # Replace the manifest atomically so a crash never leaves it half written
+        temp_path = manifest_path.with_suffix('.tmp')
+        try:
+            temp_path.write_text(json.dumps([asdict(metadata) for metadata in manifest.values()]), encoding='utf-8')
+            os.replace(temp_path, manifest_path)
+        except OSError:
+            pass
+    return index
+
+def _read_snippets(file_path, offsets):
+    # One open per file however many of its chunks are on the page
+    snippets = {}
+    try:
+        with open(file_path, 'rb') as f:
+            for offset in sorted(offsets):
+                f.seek(offset)
+                snippets[offset] = f.read(CHUNK_SIZE).decode('utf-8', errors='ignore')
+    except:
+        pass
+    return snippets
+
+def _read_window(file_path, offset):
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        start = max(0, offset - 100)
+        end = min(size, offset + 900)
+        # A 1 KB window is cheaper to read directly than to map the file for
+        f.seek(start)
+        chunk = f.read(max(0, end - start)).decode('utf-8', errors='ignore')
+    return start, end, size, chunk
+
+def _format_hit(r):
+    return (
+        f"File: {r.file}\n"
+        f"Score: {r.score:.2f}\n"
+        f"Offset: {r.char_offset}\n"
+        f"Context:\n{r.chunk}\n\n"
+        f"{HIT_SEPARATOR}\n\n"
+    )
+
+def _search(search_index, tantivy_query, fuzzy_query, limit, skip, exact_total, search_path, full_path_output):
+    searcher = search_index.searcher()
+    search_query = tantivy_query if fuzzy_query is None else fuzzy_query
+    # Without a count Tantivy can stop scoring once the top hits are settled
+    search_result = searcher.search(search_query, limit=limit, count=exact_total, offset=skip)
+    search_results = search_result.hits
+    total_count = search_result.count
+    if total_count is None and len(search_results) < limit:
+        if search_results or skip == 0:
+            # A short page means every match up to the end has been seen
+            total_count = skip + len(search_results)
+        else:
+            # An empty page past the end says nothing about where the matches stop
+            total_count = searcher.search(search_query, limit=1, count=True).count
+    
+    hits = []
+    offsets_by_file = {}
+    for score, doc_address in search_results:
+        doc = searcher.doc(doc_address)
+        file_path = doc.get_first("path")
+        char_offset = doc.get_first("char_offset")
+        hits.append((file_path, score, char_offset))
+        offsets_by_file.setdefault(file_path, set()).add(char_offset)
+    
+    snippets = {}
+    for file_path, offsets in offsets_by_file.items():
+        # Map the display path back to the file on disk
+        source = Path(file_path) if full_path_output else search_path / file_path[1:]
+        snippets[file_path] = _read_snippets(source, offsets)
+    
+    results = [
+        Hit(file_path, score, snippets[file_path].get(char_offset, ""), char_offset)
+        for file_path, score, char_offset in hits
+    ]
+    
+    return total_count, results
+
 @server.list_tools()
 async def list_tools() -> list[Tool]:
     return [
         Tool(
             name="search_file_contents",
-            description="Search for text in files using indexed full-text search. Returns: list of matches with file paths, relevance scores, character offsets, and content snippets.\n\nEXAMPLE QUERIES:\n- 'error' - Simple search\n- 'function definition' - Multiple terms\n- 'import requests' - Exact phrase\n\nBEST PRACTICES:\n1. Use list_directory_contents first to understand what you're working with\n2. Start with globPattern='*' to search all files before filtering by specific file types",
+            description="Search for text in files using indexed full-text search. Returns: list of matches with file paths, relevance scores, byte offsets, and content snippets.\n\nEXAMPLE QUERIES:\n- 'error' - Simple search\n- 'function definition' - Multiple terms\n- 'import requests' - Exact phrase\n\nBEST PRACTICES:\n1. Use list_directory_contents first to understand what you're working with\n2. Start with globPattern='*' to search all files before filtering by specific file types",
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -30,13 +561,18 @@ async def list_tools() -> list[Tool]:
                     },
                     "globPattern": {
                         "type": "string",
-                        "description": "Glob pattern relative to search path (e.g., '*', '*.txt', 'data/**', 'src/**/*.txt'). Leading slashes are ignored. Default searches all files.",
+                        "description": "Glob pattern relative to search path (e.g., '*', '*.txt', 'data/**', 'src/**/*.txt'). '*' and '?' match within one path segment and '**' matches across directories. A pattern without '/' matches file names at any depth. Leading slashes are ignored. Default searches all files.",
                         "default": "*"
                     },
                     "skip": {
                         "type": "integer",
                         "description": "Skip first N matches",
                         "default": 0
+                    },
+                    "exactTotal": {
+                        "type": "boolean",
+                        "description": "Count every match to report an exact total. Slower on large indexes; by default the search stops once the page is filled.",
+                        "default": False
                     }
                 },
                 "required": ["query"]
@@ -44,7 +580,7 @@ async def list_tools() -> list[Tool]:
         ),
         Tool(
             name="search_file_contents_with_lucene_syntax",
-            description="Search for text in files using Tantivy query syntax with manual control. Write queries manually with operators like fuzzy (~2), wildcards (*), phrases (\"\"), boolean (AND/OR/NOT), and more. Use this when you want exact control over the query. Returns: list of matches with file paths, relevance scores, character offsets, and content snippets.\n\nEXAMPLE QUERIES:\n- 'error~2' - Fuzzy search (max 2 edits)\n- 'def*' - Wildcard search\n- '\"exact phrase\"' - Exact phrase\n- 'term1 AND term2' - Boolean AND\n- '(error OR warning) AND log' - Complex boolean",
+            description="Search for text in files using Tantivy query syntax with manual control. Write queries manually with operators like fuzzy (~2), wildcards (*), phrases (\"\"), boolean (AND/OR/NOT), and more. Use this when you want exact control over the query. Returns: list of matches with file paths, relevance scores, byte offsets, and content snippets.\n\nEXAMPLE QUERIES:\n- 'error~2' - Fuzzy search (max 2 edits)\n- 'def*' - Wildcard search\n- '\"exact phrase\"' - Exact phrase\n- 'term1 AND term2' - Boolean AND\n- '(error OR warning) AND log' - Complex boolean",
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -54,13 +590,18 @@ async def list_tools() -> list[Tool]:
                     },
                     "globPattern": {
                         "type": "string",
-                        "description": "Glob pattern relative to search path (e.g., '*', '*.txt', 'data/**', 'src/**/*.txt'). Leading slashes are ignored. Default searches all files.",
+                        "description": "Glob pattern relative to search path (e.g., '*', '*.txt', 'data/**', 'src/**/*.txt'). '*' and '?' match within one path segment and '**' matches across directories. A pattern without '/' matches file names at any depth. Leading slashes are ignored. Default searches all files.",
                         "default": "*"
                     },
                     "skip": {
                         "type": "integer",
                         "description": "Skip first N matches",
                         "default": 0
+                    },
+                    "exactTotal": {
+                        "type": "boolean",
+                        "description": "Count every match to report an exact total. Slower on large indexes; by default the search stops once the page is filled.",
+                        "default": False
                     }
                 },
                 "required": ["query"]
@@ -68,7 +609,7 @@ async def list_tools() -> list[Tool]:
         ),
         Tool(
             name="read_file_chunk",
-            description="Read a text chunk from a file around a specific character offset. Returns approximately 1000 characters (100 before and 900 after the offset). Returns: file path, character range, and text content.",
+            description="Read a text chunk from a file around a specific byte offset. Returns approximately 1000 bytes (100 before and 900 after the offset). Returns: file path, byte range, and text content.",
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -78,7 +619,7 @@ async def list_tools() -> list[Tool]:
                     },
                     "charOffset": {
                         "type": "integer",
-                        "description": "Character offset in the file"
+                        "description": "Byte offset in the file, as reported by search results"
                     }
                 },
                 "required": ["filePath", "charOffset"]
@@ -103,6 +644,8 @@ async def list_tools() -> list[Tool]:
 
 @server.call_tool()
 async def call_tool(name: str, arguments: dict) -> list[TextContent]:
+    global INDEX_GENERATION
+    
     if name == "list_directory_contents":
         dir_path = arguments.get("path", "")
         full_path_output = USE_FULL_PATH
@@ -130,17 +673,23 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
             )]
         
         try:
-            items = sorted(full_path.iterdir(), key=lambda x: (not x.is_dir(), x.name.lower()))
+            # DirEntry caches the file type from readdir, so sorting and
+            # splitting folders from files costs no extra stat calls
+            with os.scandir(full_path) as entries:
+                items = sorted(entries, key=lambda x: (not x.is_dir(), x.name.lower()))
             
             folders = []
             files = []
+            # Entries are named relative to the listed directory, so their
+            # display paths extend its relative path instead of re-deriving it
+            relative_dir = Path(dir_path).as_posix()
+            display_dir = '/' if relative_dir == '.' else f"/{relative_dir}/"
             
             for item in items:
                 if full_path_output:
-                    display_path = str(item).replace('\\', '/')
+                    display_path = item.path.replace(os.sep, '/')
                 else:
-                    relative = item.relative_to(search_path)
-                    display_path = '/' + str(relative).replace('\\', '/')
+                    display_path = display_dir + item.name
                 
                 if item.is_dir():
                     folders.append(display_path + '/')
@@ -148,25 +697,25 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
                     size = item.stat().st_size
                     files.append(f"{display_path} ({size} bytes)")
             
-            output = f"Directory: {dir_path or '/'}\n\n"
+            parts = [f"Directory: {dir_path or '/'}\n\n"]
             
             if folders:
-                output += "Folders:\n"
+                parts.append("Folders:\n")
                 for folder in folders:
-                    output += f"  {folder}\n"
-                output += "\n"
+                    parts.append(f"  {folder}\n")
+                parts.append("\n")
             
             if files:
-                output += "Files:\n"
+                parts.append("Files:\n")
                 for file in files:
-                    output += f"  {file}\n"
+                    parts.append(f"  {file}\n")
             
             if not folders and not files:
-                output += "(empty directory)\n"
+                parts.append("(empty directory)\n")
             
-            output += f"\nTotal: {len(folders)} folders, {len(files)} files"
+            parts.append(f"\nTotal: {len(folders)} folders, {len(files)} files")
             
-            return [TextContent(type="text", text=output)]
+            return [TextContent(type="text", text="".join(parts))]
             
         except Exception as e:
             return [TextContent(
@@ -198,32 +747,32 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
             )]
         
         try:
-            content = full_path.read_text(encoding='utf-8', errors='ignore')
+            # Disk reads run on a worker thread so the event loop stays responsive
+            start, end, max_range, chunk = await asyncio.to_thread(_read_window, full_path, char_offset)
         except Exception as e:
             return [TextContent(
                 type="text",
                 text=f"Error reading file: {e}"
             )]
         
-        start = max(0, char_offset - 100)
-        end = min(len(content), char_offset + 900)
-        chunk = content[start:end]
-        max_range = len(content)
+        display_path = full_path.as_posix() if full_path_output else file_path
+        parts = [
+            f"File: {display_path}\n",
+            f"Range: {start}-{end} (offset {char_offset}) [Max: 0-{max_range}]\n",
+            f"Context:\n{chunk}\n\n\n"
+        ]
         
-        display_path = str(full_path).replace('\\', '/') if full_path_output else file_path
-        output = f"File: {display_path}\n"
-        output += f"Range: {start}-{end} (offset {char_offset}) [Max: 0-{max_range}]\n"
-        output += f"Context:\n{chunk}\n\n\n"
-        
-        return [TextContent(type="text", text=output)]
+        return [TextContent(type="text", text="".join(parts))]
     
     if name not in ("search_file_contents", "search_file_contents_with_lucene_syntax"):
         raise ValueError(f"Unknown tool: {name}")
     
     query = arguments["query"]
-    file_pattern = arguments.get("globPattern", "*")
+    # Normalize file pattern; '**' is handled by _compile_glob
+    file_pattern = arguments.get("globPattern", "*").lstrip('/') or "*"
     skip = arguments.get("skip", 0)
     limit = arguments.get("limit", 10)
+    exact_total = arguments.get("exactTotal", False)
     full_path_output = USE_FULL_PATH
     bypass_fuzzy = (name == "search_file_contents_with_lucene_syntax")
     
@@ -232,119 +781,44 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
     if not search_path.exists():
         return [TextContent(type="text", text=f"Path not found: {SEARCH_PATH}")]
     
-    global SEARCH_INDEX
-    if SEARCH_INDEX is None:
-        schema_builder = tantivy.SchemaBuilder()
-        schema_builder.add_text_field("path", stored=True)
-        schema_builder.add_text_field("content", stored=True, tokenizer_name="default")
-        schema_builder.add_integer_field("char_offset", stored=True, indexed=False)
-        schema = schema_builder.build()
-        
-        SEARCH_INDEX = tantivy.Index(schema, path=None)
-        writer = SEARCH_INDEX.writer()
-        
-        CHUNK_SIZE = 500
-        CHUNK_OVERLAP = 100
-        
-        # Normalize file pattern: remove leading slash, ensure proper glob syntax
-        if file_pattern != "*":
-            file_pattern = file_pattern.lstrip('/')
-            if file_pattern.endswith('**'):
-                file_pattern += '/*'
-        
-        for file_path in search_path.rglob('*'):
-            if not file_path.is_file():
-                continue
-            
-            # Filter by file pattern during indexing
-            if file_pattern != "*":
-                relative_path = file_path.relative_to(search_path)
-                relative_str = str(relative_path).replace('\\', '/')
-                
-                # Check if it's an exact path or a glob pattern
-                if '*' in file_pattern or '?' in file_pattern:
-                    # Use glob matching
-                    if not relative_path.match(file_pattern):
-                        continue
-                else:
-                    # Exact path match
-                    if relative_str != file_pattern:
-                        continue
-            
-            try:
-                content = file_path.read_text(encoding='utf-8', errors='ignore')
-                if full_path_output:
-                    display_path = str(file_path).replace('\\', '/')
-                else:
-                    display_path = '/' + str(file_path.relative_to(search_path)).replace('\\', '/')
-                
-                # Chunk the file content
-                for i in range(0, len(content), CHUNK_SIZE - CHUNK_OVERLAP):
-                    chunk = content[i:i + CHUNK_SIZE]
-                    if chunk.strip():  # Skip empty chunks
-                        writer.add_document(tantivy.Document(
-                            path=[display_path],
-                            content=[chunk],
-                            char_offset=[i]
-                        ))
-            except:
-                continue
-        
-        writer.commit()
-        SEARCH_INDEX.reload()
+    # Each glob pattern has its own index since files are filtered while indexing.
+    # Patterns that are already indexed never wait behind another pattern's build.
+    if file_pattern not in SEARCH_INDEXES:
+        async with _INDEX_LOCK:
+            if file_pattern not in SEARCH_INDEXES:
+                # Loaded indexes are bounded like the cache directory
+                while len(SEARCH_INDEXES) >= MAX_CACHED_INDEXES:
+                    SEARCH_INDEXES.popitem(last=False)
+                # Indexing runs on a worker thread so other tool calls are served meanwhile
+                SEARCH_INDEXES[file_pattern] = await asyncio.to_thread(_build_index, search_path, file_pattern, full_path_output)
+                # Results cached against an earlier index are no longer reachable
+                INDEX_GENERATION += 1
+                _parse_queries.cache_clear()
+    SEARCH_INDEXES.move_to_end(file_pattern)
+    search_index = SEARCH_INDEXES[file_pattern]
+    
+    # Agents often repeat the same search while iterating
+    cache_key = (query, file_pattern, skip, limit, bypass_fuzzy, exact_total, INDEX_GENERATION)
+    cached = _cached_result(cache_key)
+    if cached is not None:
+        return [TextContent(type="text", text=cached)]
     
     try:
-        # Add automatic fuzzy matching for all queries (unless bypassed)
-        if not bypass_fuzzy:
-            # Split query into terms and add fuzzy matching to each
-            terms = query.split()
-            if len(terms) == 1 and '"' not in query and '~' not in query and '*' not in query:
-                # Single term: combine fuzzy and prefix matching
-                fuzzy_query = f"({query}~2 OR {query}*)"
-            else:
-                # Multiple terms or special operators: just apply fuzzy to plain terms
-                fuzzy_terms = []
-                for term in terms:
-                    if '"' not in term and '~' not in term and '*' not in term and term.upper() not in ('AND', 'OR', 'NOT'):
-                        fuzzy_terms.append(f"({term}~2 OR {term}*)")
-                    else:
-                        fuzzy_terms.append(term)
-                fuzzy_query = ' '.join(fuzzy_terms)
-            tantivy_query = SEARCH_INDEX.parse_query(fuzzy_query, ["content"])
-        else:
-            tantivy_query = SEARCH_INDEX.parse_query(query, ["content"])
+        tantivy_query, fuzzy_query = _parse_queries(search_index, query, bypass_fuzzy)
     except:
         return [TextContent(type="text", text=f"Invalid query syntax: {query}")]
     
-    searcher = SEARCH_INDEX.searcher()
-    search_result = searcher.search(tantivy_query, limit=limit, offset=skip)
-    search_results = search_result.hits
-    total_count = search_result.count
+    total_count, results = await asyncio.to_thread(_search, search_index, tantivy_query, fuzzy_query, limit, skip, exact_total, search_path, full_path_output)
     
-    results = []
+    if total_count is None:
+        parts = [f"Showing matches {skip + 1}-{skip + len(results)} (more may exist; use skip to page or exactTotal for the full count)\n\n"]
+    else:
+        parts = [f"Total found: {total_count} matches\n\n"]
+    parts.extend(map(_format_hit, results))
     
-    for score, doc_address in search_results:
-        doc = searcher.doc(doc_address)
-        file_path = doc.get_first("path")
-        content = doc.get_first("content")
-        char_offset = doc.get_first("char_offset")
-        
-        results.append({
-            'file': file_path,
-            'score': score,
-            'chunk': content,
-            'char_offset': char_offset
-        })
-    
-    output = f"Total found: {total_count} matches\n\n"
-    for r in results:
-        output += f"File: {r['file']}\n"
-        output += f"Score: {r['score']:.2f}\n"
-        output += f"Offset: {r['char_offset']}\n"
-        output += f"Context:\n{r['chunk']}\n\n"
-        output += "-"*20+"\n\n"
-    
-    return [TextContent(type="text", text=output)]
+    text = "".join(parts)
+    _cache_result(cache_key, text)
+    return [TextContent(type="text", text=text)]
 
 def main():
     global SEARCH_PATH, USE_FULL_PATH